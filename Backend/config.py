@@ -1,12 +1,20 @@
 # Backend/config.py
 # Minimal, dependency-free config so your app runs without pydantic.
 import os
+from dotenv import load_dotenv
+
+# Load .env before Settings reads the environment (previously done in db.py)
+load_dotenv()
+
+# truthy spellings accepted for boolean env vars (case-insensitive)
+_TRUE_SET = frozenset({"1", "true", "yes"})
+
 
 class Settings:
     # default identical to previous behavior
     MONGODB_URI: str = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
     # CLEAR_LEAVES_ON_START accepts "1","true","yes" (case-insensitive)
-    CLEAR_LEAVES_ON_START: bool = os.getenv("CLEAR_LEAVES_ON_START", "false").lower() in {"1","true","yes"}
+    CLEAR_LEAVES_ON_START: bool = os.getenv("CLEAR_LEAVES_ON_START", "false").lower() in _TRUE_SET
 
 # module-level settings object (imported elsewhere as `from .config import settings`)
 settings = Settings()
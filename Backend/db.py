@@ -1,88 +1,185 @@
 # Backend/db.py
-from os import getenv
-from dotenv import load_dotenv
-from pymongo import MongoClient, ASCENDING
-from pymongo.errors import OperationFailure
-from .config import settings  # new import but behavior preserved
-
-# Load .env as before (keeps prior behavior)
-load_dotenv()
+from datetime import datetime, timezone
+from functools import lru_cache
+from bson import encode
+from bson.raw_bson import RawBSONDocument
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from .config import settings  # .env is loaded there
 
 # Use settings.MONGODB_URI (falls back to same default)
 MONGODB_URI = settings.MONGODB_URI
 
-client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+# Client and collections are built lazily on first access (see _get_db /
+# __getattr__), so importing this module is cheap. The async startup work
+# (migration, indexes, seed) runs once via init_db() from the app's startup hook.
+_LAZY_NAMES = ("client", "db", "employee_collection", "leave_collection")
 
-db = client["hr_copilot"]
-employee_collection = db["employees"]
-leave_collection = db["leaves"]
 
-def safe_create_index(collection, keys, **kwargs):
+async def safe_create_index(collection, keys, **kwargs):
     try:
-        return collection.create_index(keys, **kwargs)
+        return await collection.create_index(keys, **kwargs)
     except OperationFailure as e:
         print(f"⚠️ Skipping index {kwargs.get('name')}: {e}")
         return None
 
-safe_create_index(
-    employee_collection,
-    [("emp_id", ASCENDING)],
-    unique=True,
-    name="emp_id_unique",
-)
-
-safe_create_index(
-    leave_collection,
-    [("emp_id", ASCENDING), ("from_date", ASCENDING)],
-    name="emp_fromdate",
-)
-
-# Lightweight migration (unchanged)
-employee_collection.update_many(
-    {"leave_balance": {"$type": "number"}},
-    [
-        {
-            "$set": {
-                "leave_balance": {
-                    "casual": "$leave_balance",
-                    "sick": 0,
+
+# Sentinel id in the _migrations collection once the numeric -> dict
+# leave_balance migration has run; later restarts skip the update_many.
+# Legacy docs written after that are normalized lazily by main.py on their
+# next /leave-balance read.
+_LB_MIGRATION_ID = "lb_num_to_dict_v1"
+
+
+async def _migrate_legacy_balances(db):
+    migrations = db["_migrations"]
+    if await migrations.find_one({"_id": _LB_MIGRATION_ID}):
+        return
+    # Lightweight migration (unchanged)
+    await db["employees"].update_many(
+        {"leave_balance": {"$type": "number"}},
+        [
+            {
+                "$set": {
+                    "leave_balance": {
+                        "casual": "$leave_balance",
+                        "sick": 0,
+                    }
                 }
             }
-        }
-    ],
-)
-
-# Seed sample data (keeps original documents & logic)
-if employee_collection.count_documents({}) == 0:
-    employees = [
-        {
-            "emp_id": "10001",
-            "name": "Sonal Sharma",
-            "project": "Evernorth UIM",
-            "leave_balance": {"casual": 12, "sick": 8},
-        },
-        {
-            "emp_id": "10002",
-            "name": "Amit Kumar",
-            "project": "Newton Fines & Tolls",
-            "leave_balance": {"casual": 10, "sick": 6},
-        },
-        {
-            "emp_id": "10003",
-            "name": "Aashi Jain",
-            "project": "Healthcare Insights",
-            "leave_balance": {"casual": 15, "sick": 5},
-        },
-        {
-            "emp_id": "10004",
-            "name": "Rohit Verma",
-            "project": "Insurance Automation",
-            "leave_balance": {"casual": 8, "sick": 12},
-        },
-    ]
-    employee_collection.insert_many(employees)
+        ],
+    )
+    try:
+        await migrations.insert_one({"_id": _LB_MIGRATION_ID, "at": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        pass  # another worker recorded it first
+
+
+# Sample employees (keeps original documents), BSON-encoded once at import so
+# the seed insert ships the bytes as-is instead of re-encoding each dict.
+_SEED_EMPLOYEES = [
+    {
+        "emp_id": "10001",
+        "name": "Sonal Sharma",
+        "project": "Evernorth UIM",
+        "leave_balance": {"casual": 12, "sick": 8},
+    },
+    {
+        "emp_id": "10002",
+        "name": "Amit Kumar",
+        "project": "Newton Fines & Tolls",
+        "leave_balance": {"casual": 10, "sick": 6},
+    },
+    {
+        "emp_id": "10003",
+        "name": "Aashi Jain",
+        "project": "Healthcare Insights",
+        "leave_balance": {"casual": 15, "sick": 5},
+    },
+    {
+        "emp_id": "10004",
+        "name": "Rohit Verma",
+        "project": "Insurance Automation",
+        "leave_balance": {"casual": 8, "sick": 12},
+    },
+]
+_SEED_RAW = tuple(RawBSONDocument(encode(doc)) for doc in _SEED_EMPLOYEES)
+
+
+async def _seed_if_empty(employee_collection):
+    """Seed sample employees into an empty collection (keeps original documents)."""
+    if await employee_collection.count_documents({}) != 0:
+        return
+    # unordered bulk insert; emp_id_unique already exists, so if another
+    # worker seeds concurrently its duplicates are rejected here
+    try:
+        await employee_collection.insert_many(list(_SEED_RAW), ordered=False, bypass_document_validation=True)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        return  # another worker seeded first
     print("✅ Employees seeded successfully!")
 
-if getenv("CLEAR_LEAVES_ON_START", "false").lower() in {"1", "true", "yes"}:
-    leave_collection.delete_many({})
-    print("✅ Leaves collection cleared!")
+
+async def _ensure_indexes(employee_collection, leave_collection):
+    """Create indexes before the seed load; emp_id_unique guards it against concurrent workers."""
+    await safe_create_index(
+        employee_collection,
+        [("emp_id", ASCENDING)],
+        unique=True,
+        name="emp_id_unique",
+        background=False,
+    )
+
+    # covers /leave-history: emp_id equality + from_date sort, plus every
+    # projected field so the query is answered from the index alone.
+    # Requires MongoDB 4.2+: older servers enforce a 1024-byte index key
+    # limit, so a long free-text `reason` would make the insert fail.
+    cov = await safe_create_index(
+        leave_collection,
+        [
+            ("emp_id", ASCENDING),
+            ("from_date", ASCENDING),
+            ("leave_type", ASCENDING),
+            ("to_date", ASCENDING),
+            ("days", ASCENDING),
+            ("reason", ASCENDING),
+        ],
+        name="emp_fromdate_cov",
+        background=False,
+    )
+    # emp_fromdate_cov supersedes the old (emp_id, from_date) index; if the
+    # covering build failed, keep the old one so history stays indexed
+    if cov:
+        try:
+            await leave_collection.drop_index("emp_fromdate")
+        except OperationFailure:
+            pass  # already gone
+
+
+@lru_cache(maxsize=1)
+def _get_db() -> dict:
+    """Build the (single, shared) Motor client and collection handles; no I/O."""
+    client = AsyncIOMotorClient(
+        MONGODB_URI,
+        serverSelectionTimeoutMS=5000,
+        # wire compression: first one the server also lists in
+        # --networkMessageCompressors wins (zstd needs `zstandard`, zlib is stdlib)
+        compressors="zstd,zlib",
+        zlibCompressionLevel=6,
+        maxPoolSize=200,
+        minPoolSize=10,
+        retryWrites=True,
+        w="majority",
+    )
+
+    db = client["hr_copilot"]
+    return {
+        "client": client,
+        "db": db,
+        "employee_collection": db["employees"],
+        "leave_collection": db["leaves"],
+    }
+
+
+async def init_db() -> None:
+    """One-time startup work: migration, indexes, seed (in that order)."""
+    handles = _get_db()
+    employee_collection = handles["employee_collection"]
+    leave_collection = handles["leave_collection"]
+
+    await _migrate_legacy_balances(handles["db"])
+    await _ensure_indexes(employee_collection, leave_collection)
+    await _seed_if_empty(employee_collection)
+
+    if settings.CLEAR_LEAVES_ON_START:
+        await leave_collection.delete_many({})
+        print("✅ Leaves collection cleared!")
+
+
+def __getattr__(name):
+    # PEP 562: materialize client/collections on first attribute access
+    if name in _LAZY_NAMES:
+        return _get_db()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
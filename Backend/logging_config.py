@@ -1,9 +1,11 @@
 # Backend/logging_config.py
 import logging
+import os
 
-def setup_logging():
+def setup_logging(level=None):
+    # LOG_LEVEL env var (e.g. DEBUG, INFO); per-request logs are DEBUG
     logging.basicConfig(
-        level=logging.INFO,
+        level=level or os.environ.get("LOG_LEVEL", "WARNING").upper(),
         format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
     )
 
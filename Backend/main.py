@@ -1,55 +1,237 @@
 # Backend/main.py
+import asyncio
 from datetime import date, datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterable, AsyncIterator, Literal, Tuple
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Request, Body
-from pydantic import BaseModel, Field
-# Use package-qualified import so uvicorn package import works reliably
-from Backend.db import employee_collection, leave_collection
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+# Use package-qualified import so uvicorn package import works reliably.
+# Collections are reached through the module (db.employee_collection) so the
+# Mongo client is only built on first use, not at import time.
+from Backend import db
 # Needed for atomic find_one_and_update return document constant
 from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
 # config + logging (non-breaking)
 from .config import settings
 from .logging_config import setup_logging
 import logging
+import orjson
 import re
 
 # init logging for clearer output (no behavior change)
 setup_logging()
 logger = logging.getLogger("hr_copilot")
 
-app = FastAPI(title="HR Copilot Backend")
+app = FastAPI(title="HR Copilot Backend", default_response_class=ORJSONResponse)
+
+
+@app.on_event("startup")
+async def _warm_db():
+    # connect, migrate, seed and index once in the serving process
+    await db.init_db()
+
 
 # -----------------------------
 # Helpers (unchanged logic)
 # -----------------------------
-def _normalize_leave_balance(lb) -> dict:
+def _normalize_leave_balance(lb) -> Tuple[dict, bool]:
+    """
+    Returns (balances, was_legacy). was_legacy is True when the stored shape
+    differs from {"casual", "sick"} and needs writing back.
+    """
     if isinstance(lb, dict):
-        return {
-            "casual": int(lb.get("casual", 0)),
-            "sick": int(lb.get("sick", 0)),
+        balances = {
+            # `or 0`: a null key counts as 0, like $ifNull in _LB_NORMALIZED_EXPR
+            "casual": int(lb.get("casual") or 0),
+            "sick": int(lb.get("sick") or 0),
         }
-    total = int(lb or 0)
-    return {"casual": total, "sick": 0}
+        return balances, not set(lb) >= {"casual", "sick"}
+    # legacy scalar total; non-numeric values count as 0, as in _LB_NORMALIZED_EXPR
+    try:
+        total = int(lb or 0)
+    except (TypeError, ValueError):
+        total = 0
+    return {"casual": total, "sick": 0}, True
+
+
+# Balance reads only need these fields. leave_balance is projected whole (it's
+# two ints) rather than as leave_balance.casual/.sick, which would silently
+# drop a legacy numeric balance and make it look like zero.
+_LB_PROJ = {"_id": 0, "emp_id": 1, "leave_balance": 1}
+
+# Server-side equivalent of _normalize_leave_balance: an object keeps its
+# casual/sick (missing keys become 0); any other stored value is a legacy
+# scalar total, {"casual": n, "sick": 0} (non-numeric / missing -> 0).
+_LB_IS_OBJECT = {"$eq": [{"$type": "$leave_balance"}, "object"]}
+_LB_OBJECT_FIELDS = {
+    "casual": {"$ifNull": ["$leave_balance.casual", 0]},
+    "sick": {"$ifNull": ["$leave_balance.sick", 0]},
+}
+_LB_LEGACY_FIELDS = {
+    "casual": {"$convert": {"input": "$leave_balance", "to": "int", "onError": 0, "onNull": 0}},
+    "sick": 0,
+}
+_LB_NORMALIZED_EXPR = {"$cond": [_LB_IS_OBJECT, _LB_OBJECT_FIELDS, _LB_LEGACY_FIELDS]}
+# Same normalization for writes: an object balance is merged rather than
+# rebuilt, so keys other than casual/sick survive the update.
+_LB_NORMALIZED_WRITE_EXPR = {
+    "$cond": [_LB_IS_OBJECT, {"$mergeObjects": ["$leave_balance", _LB_OBJECT_FIELDS]}, _LB_LEGACY_FIELDS]
+}
+
+# Per-leave-type field path, projection and normalized-balance expression,
+# built once instead of per request
+_LEAVE_TEMPLATES = {
+    lt: {
+        "filter_key": f"leave_balance.{lt}",
+        "projection": {f"leave_balance.{lt}": 1, "_id": 0},
+        "balance_expr": {"$let": {"vars": {"lb": _LB_NORMALIZED_EXPR}, "in": f"$$lb.{lt}"}},
+    }
+    for lt in ("casual", "sick")
+}
+
 
+# Read-through cache of the read-only profile fields, keyed by emp_id.
+# leave_balance is deliberately not cached: with several workers a cached
+# balance can't be invalidated everywhere, so balances are always read from Mongo.
+_PROFILE_FIELDS = ("emp_id", "name", "project")
+_PROFILE_PROJ = {"_id": 0, **{f: 1 for f in _PROFILE_FIELDS}}
+_EMP_CACHE: "TTLCache[str, dict]" = TTLCache(maxsize=1024, ttl=60)
 
-def _ensure_normalized_in_db(emp_id: str, balances: dict) -> None:
-    employee_collection.update_one(
+
+async def _get_employee_cached(emp_id: str) -> Optional[dict]:
+    """Profile ({emp_id, name, project}) only; never includes leave_balance."""
+    emp = _EMP_CACHE.get(emp_id)
+    if emp is None:
+        emp = await db.employee_collection.find_one({"emp_id": emp_id}, _PROFILE_PROJ)
+        if emp is not None:
+            _EMP_CACHE[emp_id] = emp
+    return emp
+
+
+async def _ensure_normalized_in_db(emp_id: str) -> None:
+    # pipeline update, so a scalar balance is rewritten too (a dotted $set
+    # into a number fails server-side); extra object keys are kept
+    await db.employee_collection.update_one(
         {"emp_id": emp_id},
-        {
-            "$set": {
-                "leave_balance.casual": balances["casual"],
-                "leave_balance.sick": balances["sick"],
-            }
-        }
+        [{"$set": {"leave_balance": _LB_NORMALIZED_WRITE_EXPR}}],
     )
 
 
+# Transactions need a replica set / mongos; flipped off on the first
+# IllegalOperation from a standalone dev server.
+_transactions_supported = True
+
+
+async def _deduct_and_record(emp_id: str, leave_type: str, days: int, leave_doc: dict) -> Optional[dict]:
+    """
+    Decrement the balance and insert the leave record as one unit.
+    The update is a pipeline that normalizes a legacy leave_balance, checks the
+    bucket and decrements it in a single atomic find_one_and_update.
+    Returns the updated employee projection, or None if the balance guard didn't match.
+    """
+    global _transactions_supported
+    tpl = _LEAVE_TEMPLATES[leave_type]
+    filter_query = {"emp_id": emp_id, "$expr": {"$gte": [tpl["balance_expr"], days]}}
+    update = [
+        {"$set": {"leave_balance": _LB_NORMALIZED_WRITE_EXPR}},
+        {"$set": {tpl["filter_key"]: {"$subtract": ["$" + tpl["filter_key"], days]}}},
+    ]
+    projection = tpl["projection"]
+
+    async def _txn(session):
+        updated = await db.employee_collection.find_one_and_update(
+            filter_query,
+            update,
+            return_document=ReturnDocument.AFTER,
+            projection=projection,
+            session=session,
+        )
+        if updated is not None:
+            # insert a copy: insert_one adds an ObjectId _id that the response can't encode
+            await db.leave_collection.insert_one(dict(leave_doc), session=session)
+        return updated
+
+    if _transactions_supported:
+        try:
+            async with await db.client.start_session() as session:
+                return await session.with_transaction(_txn)
+        except OperationFailure as e:
+            if e.code != 20:  # IllegalOperation: standalone server
+                raise
+            _transactions_supported = False
+            logger.info("transactions not supported by this deployment; using sequential writes")
+
+    # standalone fallback: same two writes, restore the balance if the insert fails
+    updated = await db.employee_collection.find_one_and_update(
+        filter_query,
+        update,
+        return_document=ReturnDocument.AFTER,
+        projection=projection,
+    )
+    if updated is None:
+        return None
+    try:
+        await db.leave_collection.insert_one(dict(leave_doc))
+    except PyMongoError:
+        # the pipeline already normalized leave_balance, so a plain $inc restores it
+        await db.employee_collection.update_one(
+            {"emp_id": emp_id},
+            {"$inc": {tpl["filter_key"]: days}},
+        )
+        raise
+    return updated
+
+
+# Documents per round-trip when streaming list endpoints
+STREAM_BATCH_SIZE = 500
+
+
+async def _iter_json(
+    first: list, cursor: AsyncIterable[dict], key: str, extra: Optional[dict] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yield the JSON object {**extra, key: [doc, ...]} as bytes: the prefetched
+    first batch, then the rest of the cursor one document at a time, so list
+    endpoints never hold the whole result set in memory.
+    """
+    key_bytes = orjson.dumps(key)
+    if extra:
+        yield orjson.dumps(extra)[:-1] + b"," + key_bytes + b":["
+    else:
+        yield b"{" + key_bytes + b":["
+    sep = b""
+    for doc in first:
+        yield sep + orjson.dumps(doc)
+        sep = b","
+    async for doc in cursor:
+        yield sep + orjson.dumps(doc)
+        sep = b","
+    yield b"]}"
+
+
+async def _stream_json(cursor, key: str, extra: Optional[dict] = None) -> StreamingResponse:
+    """
+    Run the query and fetch its first batch before any response bytes go out,
+    so query failures still become a 500 with a detail message instead
+    of a 200 with a truncated body. Only the remainder is streamed.
+    """
+    try:
+        first = await cursor.to_list(STREAM_BATCH_SIZE)
+    except PyMongoError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read {key}: {e}")
+    return StreamingResponse(_iter_json(first, cursor, key, extra), media_type="application/json")
+
+
 # -----------------------------
 # Pydantic Models (unchanged fields)
 # -----------------------------
 class ApplyLeaveRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True, frozen=True)
+
     emp_id: str = Field(..., description="Employee ID, e.g., 10001")
-    leave_type: str = Field(..., description="One of: casual, sick")
+    leave_type: Literal["casual", "sick"] = Field(..., description="One of: casual, sick")
     from_date: date
     to_date: date
     reason: str = Field(..., min_length=1)
@@ -59,6 +241,10 @@ class ApplyLeaveRequest(BaseModel):
 # Chat/parse helpers (new, small & local)
 # -----------------------------
 DATE_RE = re.compile(r"(\d{4}[/-]\d{2}[/-]\d{2})")
+# whole-string date (the reason field of /apply-leave)
+_DATE_FULL_RE = re.compile(r"^\s*(\d{4})[-/](\d{2})[-/](\d{2})\s*$")
+# case-insensitive, so the input never needs lowercasing
+SICK_RE = re.compile(r"sick", re.IGNORECASE)
 
 def _parse_iso_like(s: str) -> Optional[date]:
     """
@@ -86,7 +272,7 @@ def parse_leave_request(user_input: str) -> Dict[str, Any]:
     text = (user_input or "").strip()
     # find date tokens
     matches = DATE_RE.findall(text)
-    parsed_dates = [_parse_iso_like(m) for m in matches if _parse_iso_like(m) is not None]
+    parsed_dates = [d for d in map(_parse_iso_like, matches) if d is not None]
 
     from_date = None
     to_date = None
@@ -100,19 +286,12 @@ def parse_leave_request(user_input: str) -> Dict[str, Any]:
         # single date => one-day leave
         from_date = to_date = parsed_dates[0]
 
-    # basic leave type inference
-    leave_type = "casual"
-    lowered = text.lower()
-    if "sick" in lowered:
-        leave_type = "sick"
-    elif "casual" in lowered or "personal" in lowered or "one day" in lowered:
-        leave_type = "casual"
+    # basic leave type inference: "sick" anywhere wins, everything else
+    # ("casual", "personal", "one day", no keyword) is casual
+    leave_type = "sick" if SICK_RE.search(text) else "casual"
 
-    # reason: remove date substrings from text
-    reason = text
-    for token in matches:
-        reason = reason.replace(token, "")
-    reason = reason.strip(" ,.-")
+    # reason: remove date substrings from text (single regex pass)
+    reason = DATE_RE.sub("", text).strip(" ,.-")
 
     # If reason becomes empty and user said something like "I want leave for 2025/09/17"
     if not reason:
@@ -144,62 +323,73 @@ def open_leave_form(leave_details: Dict[str, Any], emp_id: Optional[str] = None)
 # Endpoints (identical semantics and return shapes)
 # -----------------------------
 @app.get("/")
-def health_check():
+async def health_check():
     return {"status": "ok", "message": "HR Copilot backend is running 🚀"}
 
 
+# Normalizes leave_balance server-side with the same _LB_NORMALIZED_EXPR the
+# apply-leave update uses, so /employees returns the /leave-balance shape
+# without a Python pass.
+_EMPLOYEES_PIPELINE = [
+    {
+        "$project": {
+            "_id": 0,
+            "emp_id": 1,
+            "name": 1,
+            "project": 1,
+            "leave_balance": _LB_NORMALIZED_EXPR,
+        }
+    }
+]
+
+
 @app.get("/employees")
-def list_employees():
-    employees = list(employee_collection.find({}, {"_id": 0}))
-    return {"employees": employees}
+async def list_employees():
+    cursor = db.employee_collection.aggregate(_EMPLOYEES_PIPELINE, batchSize=STREAM_BATCH_SIZE)
+    return await _stream_json(cursor, "employees")
 
 
 @app.get("/employee/{emp_id}")
-def get_employee(emp_id: str):
-    emp = employee_collection.find_one({"emp_id": emp_id}, {"_id": 0})
+async def get_employee(emp_id: str):
+    # full document incl. the live leave_balance, so not served from the
+    # profile cache; the read warms that cache for apply-leave / chat
+    emp = await db.employee_collection.find_one({"emp_id": emp_id}, {"_id": 0})
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
+    _EMP_CACHE[emp_id] = {f: emp.get(f) for f in _PROFILE_FIELDS}
     return emp
 
 
 @app.get("/leave-balance/{emp_id}")
-def get_leave_balance(emp_id: str):
-    emp = employee_collection.find_one({"emp_id": emp_id}, {"_id": 0})
+async def get_leave_balance(emp_id: str):
+    emp = await db.employee_collection.find_one({"emp_id": emp_id}, _LB_PROJ)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
 
-    lb = _normalize_leave_balance(emp.get("leave_balance", {}))
-    _ensure_normalized_in_db(emp_id, lb)
+    lb, was_legacy = _normalize_leave_balance(emp.get("leave_balance", {}))
+    if was_legacy:
+        await _ensure_normalized_in_db(emp_id)
 
     return {"emp_id": emp["emp_id"], "leave_balance": lb}
 
 
 @app.post("/apply-leave")
-def apply_leave(req: ApplyLeaveRequest):
-    emp = employee_collection.find_one({"emp_id": req.emp_id})
-    if not emp:
-        raise HTTPException(status_code=404, detail="Employee not found")
-
-    if req.leave_type not in ("casual", "sick"):
-        raise HTTPException(status_code=400, detail="Invalid leave_type. Use 'casual' or 'sick'.")
-
+async def apply_leave(req: ApplyLeaveRequest):
     # --- Minimal fix: if reason looks like a single date (e.g., "2025/09/17"), treat it as one-day leave ---
+    # support formats like "2025-09-17" and "2025/09/17"; regex prefilter so
+    # ordinary reasons ("vacation") never go through exception handling
     reason_date = None
-    try:
-        # support formats like "2025-09-17" and "2025/09/17"
-        candidate = req.reason.strip()
-        if candidate:
-            candidate_iso = candidate.replace("/", "-")
-            # date.fromisoformat will raise if not a valid ISO-like date
-            parsed = date.fromisoformat(candidate_iso)
-            reason_date = parsed
-    except Exception:
-        reason_date = None
+    m = _DATE_FULL_RE.match(req.reason)
+    if m:
+        try:
+            reason_date = date(int(m[1]), int(m[2]), int(m[3]))
+        except ValueError:  # e.g. 2025-02-30
+            reason_date = None
 
     # If reason contained a single valid date and the provided from/to are inconsistent,
     # prefer using the reason date as a one-day leave.
     if reason_date is not None:
-        logger.info(
+        logger.debug(
             "apply_leave: reason parsed as date for emp_id=%s — using as one-day leave (%s)",
             req.emp_id, reason_date
         )
@@ -208,10 +398,11 @@ def apply_leave(req: ApplyLeaveRequest):
     else:
         # No usable date in reason — keep existing behavior but auto-correct swapped dates.
         if req.from_date > req.to_date:
-            logger.info(
-                "apply_leave: swapped dates detected for emp_id=%s — auto-correcting (from=%s to=%s)",
-                req.emp_id, req.from_date, req.to_date
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "apply_leave: swapped dates detected for emp_id=%s — auto-correcting (from=%s to=%s)",
+                    req.emp_id, req.from_date, req.to_date
+                )
             req_from = req.to_date
             req_to = req.from_date
         else:
@@ -219,13 +410,22 @@ def apply_leave(req: ApplyLeaveRequest):
             req_to = req.to_date
     # ------------------------------------------------------------------------------
 
+    # Employee lookup (existence check; legacy balances are normalized and the
+    # balance re-checked atomically below) and the duplicate-application check only
+    # depend on the request, so issue both reads concurrently.
+    emp, existing = await asyncio.gather(
+        _get_employee_cached(req.emp_id),
+        db.leave_collection.find_one({
+            "emp_id": req.emp_id,
+            "leave_type": req.leave_type,
+            "from_date": str(req_from),
+            "to_date": str(req_to)
+        }),
+    )
+    if not emp:
+        raise HTTPException(status_code=404, detail="Employee not found")
+
     # ---- NEW: prevent duplicate applications for the same emp/type/date range ----
-    existing = leave_collection.find_one({
-        "emp_id": req.emp_id,
-        "leave_type": req.leave_type,
-        "from_date": str(req_from),
-        "to_date": str(req_to)
-    })
     if existing:
         raise HTTPException(status_code=400, detail="Leave already applied for these dates.")
     # ------------------------------------------------------------------------------
@@ -234,33 +434,6 @@ def apply_leave(req: ApplyLeaveRequest):
     if days_requested <= 0:
         raise HTTPException(status_code=400, detail="Invalid leave duration")
 
-    balances = _normalize_leave_balance(emp.get("leave_balance", {}))
-    _ensure_normalized_in_db(req.emp_id, balances)
-
-    filter_query = {
-        "emp_id": req.emp_id,
-        f"leave_balance.{req.leave_type}": {"$gte": days_requested}
-    }
-    update = {"$inc": {f"leave_balance.{req.leave_type}": -days_requested}}
-
-    updated = employee_collection.find_one_and_update(
-        filter_query,
-        update,
-        return_document=ReturnDocument.AFTER,
-        projection={f"leave_balance.{req.leave_type}": 1, "_id": 0}
-    )
-
-    if updated is None:
-        latest = employee_collection.find_one({"emp_id": req.emp_id}, {"_id": 0})
-        cur_bal = 0
-        if latest:
-            lb_latest = _normalize_leave_balance(latest.get("leave_balance", {}))
-            cur_bal = lb_latest.get(req.leave_type, 0)
-        raise HTTPException(
-            status_code=400,
-            detail=f"Not enough {req.leave_type} leave. Needed {days_requested}, available {cur_bal}"
-        )
-
     leave_doc = {
         "emp_id": req.emp_id,
         "leave_type": req.leave_type,
@@ -269,12 +442,25 @@ def apply_leave(req: ApplyLeaveRequest):
         "days": days_requested,
         "reason": req.reason,
     }
+
     try:
-        leave_collection.insert_one(leave_doc)
-    except Exception as e:
-        # same behavior as before: surface error (deduction already done)
+        updated = await _deduct_and_record(req.emp_id, req.leave_type, days_requested, leave_doc)
+    except PyMongoError as e:
+        # balance deduction and history insert are rolled back together
         raise HTTPException(status_code=500, detail=f"Failed to record leave: {e}")
 
+    if updated is None:
+        # single diagnostic read to tell "not found" apart from "not enough balance"
+        latest = await db.employee_collection.find_one({"emp_id": req.emp_id}, _LB_PROJ)
+        if latest is None:
+            raise HTTPException(status_code=404, detail="Employee not found")
+        lb_latest, _ = _normalize_leave_balance(latest.get("leave_balance", {}))
+        cur_bal = lb_latest.get(req.leave_type, 0)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough {req.leave_type} leave. Needed {days_requested}, available {cur_bal}"
+        )
+
     new_balance_val = updated.get("leave_balance", {}).get(req.leave_type)
     return {
         "message": "Leave applied successfully",
@@ -283,19 +469,26 @@ def apply_leave(req: ApplyLeaveRequest):
     }
 
 
+# only fields held in the emp_fromdate_cov index, so the query is covered;
+# no hint, the planner picks that index when it exists and falls back otherwise
+_HISTORY_PROJECTION = {"_id": 0, "leave_type": 1, "from_date": 1, "to_date": 1, "days": 1, "reason": 1}
+
+
 @app.get("/leave-history/{emp_id}")
-def leave_history(emp_id: str):
-    leaves = list(
-        leave_collection.find({"emp_id": emp_id}, {"_id": 0}).sort("from_date", 1)
+async def leave_history(emp_id: str):
+    cursor = (
+        db.leave_collection.find({"emp_id": emp_id}, _HISTORY_PROJECTION)
+        .sort("from_date", 1)
+        .batch_size(STREAM_BATCH_SIZE)
     )
-    return {"emp_id": emp_id, "history": leaves}
+    return await _stream_json(cursor, "history", extra={"emp_id": emp_id})
 
 
 # -----------------------------
 # Chat endpoint to support Pixie flow
 # -----------------------------
 @app.post("/chat/apply-leave")
-def chat_apply_leave(payload: Dict[str, Any] = Body(...)):
+async def chat_apply_leave(payload: Dict[str, Any] = Body(...)):
     """
     Payload: {
       "user_input": "<user phrase>",
@@ -316,7 +509,7 @@ def chat_apply_leave(payload: Dict[str, Any] = Body(...)):
 
     if not emp_id:
         # Ask frontend to request emp id but keep the parsed date so UI can prefill after emp id is provided
-        logger.info("chat_apply_leave: emp_id missing; asking user to provide it. parsed=%s", parsed)
+        logger.debug("chat_apply_leave: emp_id missing; asking user to provide it. parsed=%s", parsed)
         return {
             "need_emp_id": True,
             "message": "Please provide your Employee ID before applying for leave so I can fetch your details.",
@@ -324,9 +517,9 @@ def chat_apply_leave(payload: Dict[str, Any] = Body(...)):
         }
 
     # emp_id present: validate and prepare form for opening
-    emp = employee_collection.find_one({"emp_id": emp_id}, {"_id": 0})
+    emp = await _get_employee_cached(emp_id)
     if not emp:
-        logger.info("chat_apply_leave: provided emp_id not found: %s", emp_id)
+        logger.debug("chat_apply_leave: provided emp_id not found: %s", emp_id)
         return {
             "need_emp_id": True,
             "message": f"Employee ID '{emp_id}' not found. Please provide a valid Employee ID.",
@@ -343,7 +536,7 @@ def chat_apply_leave(payload: Dict[str, Any] = Body(...)):
         "project": emp.get("project"),
     }
 
-    logger.info("chat_apply_leave: prepared prefill for emp_id=%s parsed=%s", emp_id, parsed)
+    logger.debug("chat_apply_leave: prepared prefill for emp_id=%s parsed=%s", emp_id, parsed)
     return {
         "open_form": True,
         "form_prefill": prefill_with_emp
@@ -0,0 +1,316 @@
+# UI/chat_parsing.py
+# Chat / date parsing helpers for the Streamlit app. Kept out of
+# streamlit_app.py because Streamlit re-executes the main script on every
+# rerun; an imported module is loaded once per process, so the regexes below
+# are compiled once rather than on every widget interaction.
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+
+
+LEAVE_ALIASES = {
+    "pl": "casual",
+    "privilege": "casual",
+    "privileged": "casual",
+    "casual": "casual",
+    "cl": "casual",
+    "sl": "sick",
+    "sick": "sick",
+    "sick leave": "sick",
+}
+
+
+# one alternation over all aliases (longest first), mapped back via the dict
+_LEAVE_ALIAS_RE = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, LEAVE_ALIASES), key=len, reverse=True)) + r")\b"
+)
+
+
+@lru_cache(maxsize=256)
+def normalize_leave_type(text: str):
+    if not text:
+        return None
+    m = _LEAVE_ALIAS_RE.search(text.lower())
+    return LEAVE_ALIASES[m.group(1)] if m else None
+
+
+# unambiguous numeric formats tried with strptime before falling back to
+# dateparser (day-first/month-first forms stay with dateparser's DATE_ORDER)
+_FAST_FMTS = ("%Y-%m-%d", "%Y/%m/%d")
+# the chat is English-only; skips dateparser's per-call language detection
+_DP_LANGUAGES = ["en"]
+
+
+def _fast_iso(s: str):
+    """YYYY-MM-DD / YYYY/MM/DD by slicing + int(); several times cheaper than strptime."""
+    if len(s) == 10 and s[4] == s[7] and s[4] in "-/" and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit():
+        try:
+            return date(int(s[:4]), int(s[5:7]), int(s[8:]))
+        except ValueError:
+            return None
+    return None
+
+
+def _strptime_fast(s: str):
+    d = _fast_iso(s)
+    if d:
+        return d
+    # strptime still covers unpadded forms like 2025-9-1
+    for fmt in _FAST_FMTS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+@lru_cache(maxsize=1)
+def _get_ddp():
+    """English-only DateDataParser, built once on first free-form date.
+
+    dateparser.parse() only reuses its default parser when called without
+    languages/settings; passing languages builds a new one per call. Keeping
+    this instance loads just the English locale, once.
+    """
+    # deferred: ~0.3 s import, only needed for free-form dates
+    from dateparser.date import DateDataParser
+
+    return DateDataParser(languages=_DP_LANGUAGES)
+
+
+def parse_date_piece(s: str):
+    d = _strptime_fast(s.strip())
+    if d:
+        return d
+    res = _get_ddp().get_date_data(s)
+    return res.date_obj.date() if res and res.date_obj else None
+
+
+# remove date-like phrases from reason text
+_MONTH_NAMES = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_date_phrase_re = re.compile(
+    rf"(\b\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTH_NAMES}(?:\s+\d{{4}})?\b|\b{_MONTH_NAMES}\s+\d{{1,2}}(?:st|nd|rd|th)?(?:\s+\d{{4}})?\b|\b\d{{4}}-\d{{2}}-\d{{2}}\b)",
+    flags=re.IGNORECASE,
+)
+_MONTH_RE = re.compile(_MONTH_NAMES, re.IGNORECASE)
+_LEADING_ON_FOR_RE = re.compile(r"^\s*(on|for)\b[:\s,-]*", re.IGNORECASE)
+_MULTISPACE_RE = re.compile(r"\s{2,}")
+
+
+def strip_date_phrases(text: str) -> str:
+    if not text:
+        return text
+    cleaned = _date_phrase_re.sub("", text)
+    cleaned = _LEADING_ON_FOR_RE.sub("", cleaned)
+    cleaned = _MULTISPACE_RE.sub(" ", cleaned).strip()
+    return cleaned
+
+
+# small words -> ints
+_WORD_NUM = {
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+}
+
+
+# patterns used by the chat parsers (and the chat handler in streamlit_app.py)
+ISO_RE = re.compile(r"\d{4}[/-]\d{2}[/-]\d{2}")
+_FROM_TO_RE = re.compile(r"from (.+?) to (.+)")
+# relative keywords that map to a single day
+_REL_KW_RE = re.compile(r"today|tomorrow|next (?:mon|tues|wednes|thurs|fri|satur|sun)day|next week")
+_YEAR_RE = re.compile(r"\b\d{4}\b")
+_DAY_COUNT_RE = re.compile(r"\b(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\b\s*(?:day|days)\b", re.IGNORECASE)
+_NUM_LEAVE_RE = re.compile(r"\b(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\b.*\b(day|days|leave)\b")
+_EMP_RE = re.compile(r"\b(E?\d{4,6})\b", re.IGNORECASE)
+_HAS_DIGIT_RE = re.compile(r"\d")
+_YEAR_RANGE = range(2020, 2036)  # year-like numbers that are never employee ids
+TALE_RE = re.compile(r"\btale\b", re.IGNORECASE)
+ONE_DAY_RE = re.compile(r"\b(1|one)\b\s*(day|days)?\b")
+REASON_RE = re.compile(r"(?:because|as|for|due to|reason)\s+(.+)", re.IGNORECASE)
+# literal triggers of REASON_RE; if none is in the lowercased prompt the regex can't match
+REASON_KEYS = ("because", "as", "for", "due to", "reason")
+DATE_CHARS_RE = re.compile(r"[\d\-/\s]")
+
+
+def _word_to_int(tok: str) -> int | None:
+    tok = tok.lower().strip()
+    if tok.isdigit():
+        try:
+            return int(tok)
+        except Exception:
+            return None
+    return _WORD_NUM.get(tok)
+
+
+def extract_dates(text: str):
+    """
+    Returns (from_date, to_date) or (None, None).
+    Handles ISO dates, relative keywords, month-name preference, and day-counts.
+    """
+    # relative phrases ("tomorrow", "5th May") resolve against today, so the
+    # date is part of the cache key
+    return _extract_dates_on(text, date.today())
+
+
+@lru_cache(maxsize=256)
+def _extract_dates_on(text: str, today: date):
+    if not text:
+        return (None, None)
+    t = text.lower()
+
+    # ISO dates
+    # only the first two ISO dates matter; stop scanning after those
+    iso = [m.group(0) for m in islice(ISO_RE.finditer(t), 2)]
+    # parse_date_piece tries the fast ISO path first; mixed separators
+    # (2025-09/10) fall through to dateparser instead of being dropped
+    if len(iso) == 1:
+        d = parse_date_piece(iso[0])
+        return (d, d) if d else (None, None)
+    if len(iso) >= 2:
+        d1 = parse_date_piece(iso[0])
+        d2 = parse_date_piece(iso[1])
+        if d1 and d2:
+            return (min(d1, d2), max(d1, d2))
+        return (d1, d2)
+
+    # "from X to Y"
+    m = _FROM_TO_RE.search(t)
+    if m:
+        p1 = parse_date_piece(m.group(1))
+        p2 = parse_date_piece(m.group(2))
+        if p1 and p2:
+            return (min(p1, p2), max(p1, p2))
+        return (p1, p2)
+
+    # quick relative keywords -> same-day
+    for m in _REL_KW_RE.finditer(t):
+        d = parse_date_piece(m.group(0))
+        if d:
+            return (d, d)
+
+    # fallback to dateparser search
+    from dateparser.search import search_dates  # deferred, see parse_date_piece
+
+    hits = search_dates(text, languages=_DP_LANGUAGES) or []
+
+    def _adjust_year_if_no_year_in_token(token: str, parsed_dt: date) -> date:
+        if _YEAR_RE.search(token):
+            return parsed_dt
+        if parsed_dt.year != today.year:
+            try:
+                return parsed_dt.replace(year=today.year)
+            except Exception:
+                return parsed_dt
+        return parsed_dt
+
+    # prefer tokens containing month names
+    month_hits = [(tok, dt) for tok, dt in hits if _MONTH_RE.search(tok)]
+    other_hits = [(tok, dt) for tok, dt in hits if not _MONTH_RE.search(tok)]
+
+    if month_hits:
+        primary_token, primary_dt_raw = month_hits[0]
+        primary_dt = primary_dt_raw.date()
+        primary_dt = _adjust_year_if_no_year_in_token(primary_token, primary_dt)
+
+        # check for "n days"
+        mcount = _DAY_COUNT_RE.search(t)
+        if mcount:
+            n_tok = mcount.group(1).lower()
+            n = _word_to_int(n_tok) or (int(n_tok) if n_tok.isdigit() else None)
+            if n is None:
+                return (primary_dt, primary_dt)
+            if n <= 1:
+                return (primary_dt, primary_dt)
+            return (primary_dt, primary_dt + timedelta(days=n - 1))
+
+        if len(month_hits) >= 2:
+            parsed = []
+            for tok, dt in month_hits[:2]:
+                d = dt.date()
+                d = _adjust_year_if_no_year_in_token(tok, d)
+                parsed.append(d)
+            parsed_sorted = sorted(parsed)
+            return (parsed_sorted[0], parsed_sorted[-1])
+
+        return (primary_dt, primary_dt)
+
+    parsed_dates = []
+    for tok, dt in hits:
+        d = dt.date()
+        d = _adjust_year_if_no_year_in_token(tok, d)
+        parsed_dates.append(d)
+
+    if len(parsed_dates) == 1:
+        return (parsed_dates[0], parsed_dates[0])
+    if len(parsed_dates) >= 2:
+        parsed_dates_sorted = sorted(parsed_dates)
+        return (parsed_dates_sorted[0], parsed_dates_sorted[-1])
+
+    return (None, None)
+
+
+@lru_cache(maxsize=256)
+def extract_emp_id(text: str):
+    """
+    Extract employee id like 10001 or E10001.
+    Ignore year-like numbers (2020-2035).
+    """
+    # most prompts carry no digits at all; skip the id regex for those
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return None
+    m = _EMP_RE.search(text)
+    if not m:
+        return None
+    val = m.group(1)
+    core = val[1:] if val.upper().startswith("E") and val[1:].isdigit() else val
+    if core.isdigit() and int(core) in _YEAR_RANGE:
+        return None
+    return core
+
+
+# (intent, pattern) checked in order, first hit wins; plain substring
+# alternations, so each intent is one regex scan instead of a list of `in` checks
+_INTENT_PATTERNS = [
+    ("check_balance", re.compile(r"balance|remaining leaves|how many leaves")),
+    ("leave_history", re.compile(r"leave history|history of leaves|past leaves")),
+    (
+        "apply_leave",
+        re.compile(
+            r"apply leave|book leave|request leave|take leave|i want to (?:take|apply|book)"
+        ),
+    ),
+    ("apply_leave", _NUM_LEAVE_RE),
+    # anchored: unanchored, .search() would retry the lookahead from every
+    # offset, which is quadratic on long non-matching prompts
+    ("apply_leave", re.compile(r"\A(?=.*leave).*(?:apply|take|book)", re.DOTALL)),
+    ("policies", re.compile(r"polic(?:y|ies)|holiday")),
+]
+
+
+def canonical_prompt(text: str) -> str:
+    """Lowercase + collapse whitespace, so "Leave  Balance" and "leave balance" share cache entries."""
+    return " ".join(text.lower().split())
+
+
+@lru_cache(maxsize=256)
+def classify_intent(text: str):
+    """
+    Lightweight intent classifier for common HR intents.
+    """
+    if not text:
+        return "unknown"
+    t0 = text.lower()
+    t = TALE_RE.sub("take", t0) if "tale" in t0 else t0  # typo fix
+    for name, pat in _INTENT_PATTERNS:
+        if pat.search(t):
+            return name
+    return "unknown"
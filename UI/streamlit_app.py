@@ -3,17 +3,32 @@ import streamlit as st
 import requests
 import json
 import os
-import re
-import dateparser
-from dateparser.search import search_dates
-import pandas as pd
-from collections import defaultdict
-from datetime import date, datetime, timedelta
+from datetime import date
+# NLP / date helpers live in UI/chat_parsing.py (imported once per process)
+from chat_parsing import (
+    DATE_CHARS_RE,
+    ISO_RE,
+    ONE_DAY_RE,
+    REASON_KEYS,
+    REASON_RE,
+    TALE_RE,
+    canonical_prompt,
+    classify_intent,
+    extract_dates,
+    extract_emp_id,
+    normalize_leave_type,
+    parse_date_piece,
+    strip_date_phrases,
+)
 
 st.set_page_config(page_title="HR Copilot", page_icon="🤖", layout="wide")
 
 # backend base url (can override via env)
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+# chat messages painted per rerun before older ones are folded away
+CHAT_RENDER_TAIL = 20
+# chat turns kept in session state; oldest are dropped beyond this
+CHAT_HISTORY_MAX = 50
 
 
 # ----------------------------
@@ -38,289 +53,109 @@ HARDCODED_HOLIDAYS = {
 # Session state defaults
 # ----------------------------
 def _init_state():
-    st.session_state.setdefault("menu", "Leave Balance")
-    st.session_state.setdefault("pending_nav", None)
-    st.session_state.setdefault("chat_history", [])
-    st.session_state.setdefault("pixie_greeted", False)
-    st.session_state.setdefault("emp_id_input", "")       # numeric id as string
-    st.session_state.setdefault("emp_name", None)
-    st.session_state.setdefault("emp_project", None)
-    st.session_state.setdefault("leave_type_input", "casual")
-    st.session_state.setdefault("from_date_input", date.today())
-    st.session_state.setdefault("to_date_input", date.today())
-    st.session_state.setdefault("reason_input", "")
-    st.session_state.setdefault("prefill_from_chat", None)  # dict or None
+    # defaults are written once per session; later reruns only check the flag
+    if st.session_state.get("_inited"):
+        return
+    st.session_state.update(
+        {
+            "menu": "Leave Balance",
+            "chat_history": [],
+            "pixie_greeted": False,
+            "emp_id_input": "",  # numeric id as string
+            "emp_name": None,
+            "emp_project": None,
+            "leave_type_input": "casual",
+            "from_date_input": date.today(),
+            "to_date_input": date.today(),
+            "reason_input": "",
+            "prefill_from_chat": None,  # dict or None
+            "_inited": True,
+        }
+    )
 
 
 _init_state()
-if st.session_state.get("pending_nav"):
-    st.session_state["menu"] = st.session_state.pop("pending_nav")
 
 
 # ----------------------------
 # HTTP helpers
 # ----------------------------
-def safe_get(url, **kwargs):
+@st.cache_resource
+def _session() -> requests.Session:
+    # one keep-alive pool per process, shared across reruns and sessions
+    s = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def safe_post(url, **kwargs):
     try:
-        return requests.get(url, timeout=5, **kwargs)
+        return _session().post(url, timeout=8, **kwargs)
     except requests.exceptions.RequestException as e:
         st.warning(f"⚠️ Backend not reachable — {e}")
         return None
 
 
-def safe_post(url, **kwargs):
+@st.cache_data(ttl=60, show_spinner=False)
+def _get_json_cached(path: str) -> tuple[int, dict]:
+    # (status, JSON body) of a successful backend GET. Non-2xx statuses and
+    # undecodable bodies raise, so only good answers are ever cached
+    res = _session().get(f"{API_URL}{path}", timeout=5)
+    res.raise_for_status()
+    return res.status_code, res.json()
+
+
+def safe_get_cached(path: str):
+    """Cached GET for leave balance / history; cleared when a leave is applied."""
     try:
-        return requests.post(url, timeout=8, **kwargs)
+        return _get_json_cached(path)
+    except requests.exceptions.HTTPError as e:
+        # error answers (404 etc.) go back to the caller uncached, with their detail
+        try:
+            body = e.response.json()
+        except ValueError:
+            body = {}
+        return e.response.status_code, body if isinstance(body, dict) else {}
     except requests.exceptions.RequestException as e:
         st.warning(f"⚠️ Backend not reachable — {e}")
         return None
 
 
 def request_nav(page: str, tip: str | None = None):
-    st.session_state["pending_nav"] = page
+    # only valid before the menu radio renders (chat callback, prefill check);
+    # the radio reads "menu" later in the same run, so no st.rerun() is needed
+    st.session_state["menu"] = page
     if tip:
         st.toast(tip)
-    st.rerun()
-
-
-def lookup_employee(emp_id: str):
-    if not emp_id:
-        return None
-    res = safe_get(f"{API_URL}/employee/{emp_id}")
-    if res and res.status_code == 200:
-        return res.json()
-    return None
-
-
-# ----------------------------
-# NLP / date helpers
-# ----------------------------
-LEAVE_ALIASES = {
-    "pl": "casual",
-    "privilege": "casual",
-    "privileged": "casual",
-    "casual": "casual",
-    "cl": "casual",
-    "sl": "sick",
-    "sick": "sick",
-    "sick leave": "sick",
-}
 
 
-def normalize_leave_type(text: str):
-    if not text:
+@st.cache_data(ttl=300, show_spinner=False)
+def _lookup_employee_cached(emp_id: str) -> dict | None:
+    # only definite answers are cached: 200 -> profile, 404 -> None. Anything
+    # else (5xx, timeouts, connection errors) raises, so it is not memoized and
+    # lookup_employee reports it instead of "not found"
+    res = _session().get(f"{API_URL}/employee/{emp_id}", timeout=5)
+    if res.status_code == 404:
         return None
-    t = text.lower()
-    for k, v in LEAVE_ALIASES.items():
-        if re.search(rf"\b{k}\b", t):
-            return v
-    return None
-
-
-def parse_date_piece(s: str):
-    dt = dateparser.parse(s)
-    return dt.date() if dt else None
-
+    res.raise_for_status()
+    return res.json()
 
-# remove date-like phrases from reason text
-_MONTH_NAMES = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
-_date_phrase_re = re.compile(
-    rf"(\b\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTH_NAMES}(?:\s+\d{{4}})?\b|\b{_MONTH_NAMES}\s+\d{{1,2}}(?:st|nd|rd|th)?(?:\s+\d{{4}})?\b|\b\d{{4}}-\d{{2}}-\d{{2}}\b)",
-    flags=re.IGNORECASE,
-)
-
-
-def _strip_date_phrases(text: str) -> str:
-    if not text:
-        return text
-    cleaned = _date_phrase_re.sub("", text)
-    cleaned = re.sub(r"^\s*(on|for)\b[:\s,-]*", "", cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r"\s{2,}", " ", cleaned).strip()
-    return cleaned
-
-
-# small words -> ints
-_WORD_NUM = {
-    "one": 1,
-    "two": 2,
-    "three": 3,
-    "four": 4,
-    "five": 5,
-    "six": 6,
-    "seven": 7,
-    "eight": 8,
-    "nine": 9,
-    "ten": 10,
-}
 
-
-def _word_to_int(tok: str) -> int | None:
-    tok = tok.lower().strip()
-    if tok.isdigit():
-        try:
-            return int(tok)
-        except Exception:
-            return None
-    return _WORD_NUM.get(tok)
-
-
-def extract_dates(text: str):
-    """
-    Returns (from_date, to_date) or (None, None).
-    Handles ISO dates, relative keywords, month-name preference, and day-counts.
-    """
-    if not text:
-        return (None, None)
-    t = text.lower()
-
-    # ISO dates
-    iso = re.findall(r"\d{4}[/-]\d{2}[/-]\d{2}", t)
-    if len(iso) == 1:
-        d = parse_date_piece(iso[0])
-        return (d, d) if d else (None, None)
-    if len(iso) >= 2:
-        d1 = parse_date_piece(iso[0])
-        d2 = parse_date_piece(iso[1])
-        if d1 and d2:
-            return (min(d1, d2), max(d1, d2))
-        return (d1, d2)
-
-    # "from X to Y"
-    m = re.search(r"from (.+?) to (.+)", t)
-    if m:
-        p1 = parse_date_piece(m.group(1))
-        p2 = parse_date_piece(m.group(2))
-        if p1 and p2:
-            return (min(p1, p2), max(p1, p2))
-        return (p1, p2)
-
-    # quick relative keywords -> same-day
-    for kw in [
-        "today",
-        "tomorrow",
-        "next monday",
-        "next tuesday",
-        "next wednesday",
-        "next thursday",
-        "next friday",
-        "next saturday",
-        "next sunday",
-        "next week",
-    ]:
-        if kw in t:
-            d = parse_date_piece(kw)
-            if d:
-                return (d, d)
-
-    # fallback to dateparser search
-    hits = search_dates(text) or []
-    today = date.today()
-
-    def _adjust_year_if_no_year_in_token(token: str, parsed_dt: date) -> date:
-        if re.search(r"\b\d{4}\b", token):
-            return parsed_dt
-        if parsed_dt.year != today.year:
-            try:
-                return parsed_dt.replace(year=today.year)
-            except Exception:
-                return parsed_dt
-        return parsed_dt
-
-    # prefer tokens containing month names
-    month_hits = [(tok, dt) for tok, dt in hits if re.search(_MONTH_NAMES, tok, flags=re.IGNORECASE)]
-    other_hits = [(tok, dt) for tok, dt in hits if not re.search(_MONTH_NAMES, tok, flags=re.IGNORECASE)]
-
-    if month_hits:
-        primary_token, primary_dt_raw = month_hits[0]
-        primary_dt = primary_dt_raw.date()
-        primary_dt = _adjust_year_if_no_year_in_token(primary_token, primary_dt)
-
-        # check for "n days"
-        mcount = re.search(r"\b(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\b\s*(?:day|days)\b", t, flags=re.IGNORECASE)
-        if mcount:
-            n_tok = mcount.group(1).lower()
-            n = _word_to_int(n_tok) or (int(n_tok) if n_tok.isdigit() else None)
-            if n is None:
-                return (primary_dt, primary_dt)
-            if n <= 1:
-                return (primary_dt, primary_dt)
-            return (primary_dt, primary_dt + timedelta(days=n - 1))
-
-        if len(month_hits) >= 2:
-            parsed = []
-            for tok, dt in month_hits[:2]:
-                d = dt.date()
-                d = _adjust_year_if_no_year_in_token(tok, d)
-                parsed.append(d)
-            parsed_sorted = sorted(parsed)
-            return (parsed_sorted[0], parsed_sorted[-1])
-
-        return (primary_dt, primary_dt)
-
-    parsed_dates = []
-    for tok, dt in hits:
-        d = dt.date()
-        d = _adjust_year_if_no_year_in_token(tok, d)
-        parsed_dates.append(d)
-
-    if len(parsed_dates) == 1:
-        return (parsed_dates[0], parsed_dates[0])
-    if len(parsed_dates) >= 2:
-        parsed_dates_sorted = sorted(parsed_dates)
-        return (parsed_dates_sorted[0], parsed_dates_sorted[-1])
-
-    return (None, None)
-
-
-def extract_emp_id(text: str):
-    """
-    Extract employee id like 10001 or E10001.
-    Ignore year-like numbers (2020-2035).
-    """
-    if not text:
-        return None
-    m = re.search(r"\b(E?\d{4,6})\b", text, re.IGNORECASE)
-    if not m:
-        return None
-    val = m.group(1)
-    core = val[1:] if val.upper().startswith("E") and val[1:].isdigit() else val
-    if core.isdigit() and 2020 <= int(core) <= 2035:
+def lookup_employee(emp_id: str):
+    """Profile dict, None if the employee doesn't exist, False if the backend
+    couldn't answer (a warning has already been shown)."""
+    if not emp_id:
         return None
-    return core
-
-
-def classify_intent(text: str):
-    """
-    Lightweight intent classifier for common HR intents.
-    """
-    if not text:
-        return "unknown"
-    t0 = text.lower()
-    t = re.sub(r"\btale\b", "take", t0)  # typo fix
-    if any(k in t for k in ["leave balance", "balance", "remaining leaves", "how many leaves"]):
-        return "check_balance"
-    if any(k in t for k in ["leave history", "history of leaves", "past leaves"]):
-        return "leave_history"
-    if any(
-        k in t
-        for k in [
-            "apply leave",
-            "book leave",
-            "request leave",
-            "take leave",
-            "i want to take",
-            "i want to apply",
-            "i want to book",
-        ]
-    ):
-        return "apply_leave"
-    if re.search(r"\b(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\b.*\b(day|days|leave)\b", t):
-        return "apply_leave"
-    if any(k in t for k in ["apply", "take", "book"]) and "leave" in t:
-        return "apply_leave"
-    if any(k in t for k in ["policy", "policies", "maternity policy", "leave policy", "holiday", "holidays"]):
-        return "policies"
-    return "unknown"
+    try:
+        return _lookup_employee_cached(emp_id)
+    except requests.exceptions.HTTPError as e:
+        st.warning(f"⚠️ Employee lookup failed — {e}")
+        return False
+    except requests.exceptions.RequestException as e:
+        st.warning(f"⚠️ Backend not reachable — {e}")
+        return False
 
 
 # ----------------------------
@@ -355,41 +190,206 @@ def _normalize_holidays_input(raw_holidays):
     return [{"date": "", "name": str(raw_holidays)}]
 
 
-def show_holidays_grouped(holidays):
+@st.cache_data(show_spinner=False)
+def _load_holidays(path: str, mtime: float):
+    """Read + normalize a holidays file; mtime is part of the cache key so edits are picked up."""
+    with open(path, "r", encoding="utf-8") as fh:
+        return _normalize_holidays_input(json.load(fh))
+
+
+@st.cache_data(show_spinner=False)
+def _group_by_month(holidays):
+    """Normalize + bucket holidays by month; returns (ordered month labels, {label: date/name frame sorted by date}).
+
+    Cached on the holidays value, so the bundled HARDCODED_HOLIDAYS entries
+    (and each loaded file) are parsed and grouped once per process.
+    """
+    # deferred heavy import: only paid when the Policies tab renders
+    import pandas as pd
+
     normalized = _normalize_holidays_input(holidays)
     if not normalized:
-        st.info("No holidays to show.")
-        return
-    by_month = defaultdict(list)
-    for h in normalized:
-        raw = h.get("date", "") if isinstance(h, dict) else ""
-        name = h.get("name", "") if isinstance(h, dict) else str(h)
-        d = None
+        return [], {}
+
+    def _parse_or_none(raw):
         try:
-            d = datetime.strptime(raw, "%Y-%m-%d").date()
+            return parse_date_piece(raw)
         except Exception:
-            try:
-                parsed = dateparser.parse(raw)
-                d = parsed.date() if parsed else None
-            except Exception:
-                d = None
-        if not d:
-            by_month["Unknown"].append({"date": raw, "name": name})
-        else:
-            month_label = d.strftime("%Y - %B")
-            by_month[month_label].append({"date": d.isoformat(), "name": name})
-    months = sorted([m for m in by_month.keys() if m != "Unknown"])
-    if "Unknown" in by_month:
-        months.append("Unknown")
+            return None
+
+    df = pd.DataFrame(normalized, columns=["date", "name"])
+    # one vectorized pass for ISO dates; anything else ("26 Jan 2025") falls
+    # back to the free-form parser for just those rows
+    dt = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    miss = dt.isna() & df["date"].ne("")
+    if miss.any():
+        dt.loc[miss] = pd.to_datetime(df.loc[miss, "date"].map(_parse_or_none), errors="coerce")
+    df["date"] = dt.dt.strftime("%Y-%m-%d").fillna(df["date"])
+    df["month"] = dt.dt.strftime("%Y - %B").fillna("Unknown")
+    df["_dt"] = dt
+    # chronological, unparsed rows last; groupby keeps that order for the months
+    df = df.sort_values(["_dt", "date"], na_position="last", kind="stable")
+    # ready-to-render frames, so a Policies rerun doesn't rebuild them from dicts
+    by_month = {
+        m: sub[["date", "name"]].reset_index(drop=True) for m, sub in df.groupby("month", sort=False)
+    }
+    return list(by_month), by_month
+
+
+def show_holidays_grouped(holidays):
+    months, by_month = _group_by_month(holidays)
+    if not months:
+        st.info("No holidays to show.")
+        return
     for m in months:
         with st.expander(m, expanded=False):
-            rows = by_month[m]
-            try:
-                df = pd.DataFrame(rows).sort_values("date").reset_index(drop=True)
-                st.table(df)
-            except Exception:
-                for r in sorted(rows, key=lambda x: x.get("date") or ""):
-                    st.markdown(f"- **{r.get('date','—')}** — {r.get('name','')}")
+            st.table(by_month[m])
+
+
+# ----------------------------
+# Chat handling
+# ----------------------------
+_POLICIES_MSG = (
+    "Here are key policies:\n"
+    "- **Annual Leave:** 12 days/year\n"
+    "- **Sick Leave:** 8 days/year\n"
+    "- **Carry Forward:** up to 5 days/year\n"
+    "- **Maternity:** typically 26 weeks (see company handbook)\n\n"
+    "Opening **Policies** tab for details."
+)
+_HELP_MSG = (
+    "I can help with:\n"
+    "• **Leave Balance** — *'I want to know my leave balance 10001'*.\n"
+    "• **Apply Leave** — *'I want to take 1 PL tomorrow'*.\n"
+    "• **Leave History** — *'Show my leave history for 10001'*.\n"
+    "• **Policies** — *'maternity policy please'*.\n"
+    "Tip: include your **Employee ID**."
+)
+
+
+def _append_chat(role, msg):
+    history = st.session_state["chat_history"]
+    history.append((role, msg))
+    del history[:-CHAT_HISTORY_MAX]  # in place; no-op until the cap is hit
+
+
+def _say(msg):
+    """Append an assistant reply; the history loop in the chat column renders it."""
+    _append_chat("assistant", msg)
+
+
+def handle_prompt(text):
+    """Route one chat prompt to its intent (balance / apply / policies / help)."""
+    ss = st.session_state  # bound once; read/written throughout
+    # preprocess common typo
+    low = text.lower()
+    prompt_clean = TALE_RE.sub("take", text) if "tale" in low else text
+
+    # the parsers below are lru_cached; feed them the canonical form so case /
+    # spacing variants of a prompt hit the same entries. Reason text still
+    # comes from prompt_clean, which keeps the user's casing.
+    canon = canonical_prompt(prompt_clean)
+    intent = classify_intent(canon)
+    maybe_emp = extract_emp_id(canon)
+    # skip the lookup when this id's profile is already loaded (repeat turns
+    # for the same user); a missing name means the last lookup failed, so retry
+    if maybe_emp and not (maybe_emp == ss.get("emp_id_input") and ss.get("emp_name")):
+        ss["emp_id_input"] = maybe_emp
+        emp = lookup_employee(maybe_emp)
+        ss["emp_name"] = emp.get("name") if emp else None
+        ss["emp_project"] = emp.get("project") if emp else None
+
+    # intent: check balance -> navigate
+    if intent == "check_balance":
+        emp_id_for_balance = maybe_emp or ss.get("emp_id_input", "").strip()
+
+        if not emp_id_for_balance:
+            need_id_msg = "Please share your **Employee ID** (e.g., `10001`) so I can fetch your leave balance."
+            _say(need_id_msg)
+        else:
+            ss["emp_id_input"] = emp_id_for_balance
+            nav_msg = f"Opening **Leave Balance** for Employee ID **{emp_id_for_balance}** — navigating to the Leave Balance tab."
+            _say(nav_msg)
+            request_nav("Leave Balance")
+
+    # intent: apply leave -> prefill and navigate
+    elif intent == "apply_leave":
+        lt = normalize_leave_type(canon) or ss.get("leave_type_input", "casual")
+        d1, d2 = extract_dates(canon)
+
+        if (ONE_DAY_RE.search(low) and d1 and not d2):
+            d2 = d1
+
+        if not d1 and not d2:
+            d1 = d2 = date.today()
+
+        reason_guess = REASON_RE.search(prompt_clean) if any(k in low for k in REASON_KEYS) else None
+        if reason_guess:
+            reason_text = reason_guess.group(1).strip()[:200]
+            reason_text = strip_date_phrases(reason_text)
+        else:
+            date_tokens = ISO_RE.findall(prompt_clean)
+            if date_tokens and DATE_CHARS_RE.sub("", prompt_clean).strip() == "":
+                reason_text = ""
+            else:
+                reason_text = ss.get("reason_input", "")
+
+        ss.update(
+            {
+                "leave_type_input": lt,
+                "from_date_input": d1,
+                "to_date_input": d2,
+                "reason_input": reason_text or "",
+            }
+        )
+
+        emp_id_cur = ss.get("emp_id_input", "")
+        emp_display = emp_id_cur or "—"
+        parts = [
+            "Opening **Apply Leave** with these details prefilled:\n\n"
+            f"• Employee ID: **{emp_display}**\n"
+            f"• Leave type: **{lt}**\n"
+            f"• From: **{d1}**\n"
+            f"• To: **{d2}**\n"
+        ]
+        if reason_text:
+            parts.append(f"• Reason: *{reason_text}*\n\n")
+        parts.append("Review and click **Submit Leave Application** to apply.")
+        pref_msg = "".join(parts)
+
+        if not emp_id_cur:
+            ask_msg = (
+                "I can prefill the leave form for you, but I don't know your Employee ID yet. "
+                "Please enter your Employee ID in the 'Who are you?' box so I can fetch your profile — "
+                "I'll keep the date and reason ready for you."
+            )
+            _say(ask_msg)
+            ss["prefill_from_chat"] = {
+                "leave_type": lt,
+                "from_date": d1.isoformat() if d1 else None,
+                "to_date": d2.isoformat() if d2 else None,
+                "reason": reason_text or "",
+            }
+        else:
+            _say(pref_msg)
+            request_nav("Apply Leave")
+
+    # intent: policies -> show inline and open tab
+    elif intent == "policies":
+        _say(_POLICIES_MSG)
+        request_nav("Policies")
+
+    else:
+        _say(_HELP_MSG)
+
+
+def _on_chat_submit():
+    # runs before the script reruns, so any navigation lands in that same run
+    prompt = st.session_state.get("chat_prompt")
+    if prompt:
+        _append_chat("user", prompt)
+        handle_prompt(prompt)
+
 
 # ----------------------------
 # UI Header
@@ -419,11 +419,29 @@ with colB:
                 else:
                     st.session_state["emp_name"] = None
                     st.session_state["emp_project"] = None
-                    st.toast("⚠️ Employee not found", icon="⚠️")
+                    if emp is None:  # False: lookup failed, already warned
+                        st.toast("⚠️ Employee not found", icon="⚠️")
         p1, p2 = st.columns(2)
         p1.markdown(f"**Name:** {st.session_state['emp_name'] or '—'}")
         p2.markdown(f"**Project:** {st.session_state['emp_project'] or '—'}")
 
+# If a prefill exists and user later provided emp id, open Apply Leave
+if st.session_state.get("prefill_from_chat") and st.session_state.get("emp_id_input"):
+    pre = st.session_state.pop("prefill_from_chat")
+    try:
+        updates = {
+            "leave_type_input": pre.get("leave_type", st.session_state.get("leave_type_input")),
+            "reason_input": pre.get("reason", st.session_state.get("reason_input")),
+        }
+        if pre.get("from_date"):
+            updates["from_date_input"] = date.fromisoformat(pre.get("from_date"))
+        if pre.get("to_date"):
+            updates["to_date_input"] = date.fromisoformat(pre.get("to_date"))
+        st.session_state.update(updates)
+        request_nav("Apply Leave")
+    except Exception:
+        pass
+
 # Determine whether employee profile is present
 emp_present = bool(st.session_state.get("emp_id_input"))
 
@@ -490,38 +508,43 @@ with left_col:
         # emp present: full behavior
         if menu == "Leave Balance":
             st.subheader("📊 Check Leave Balance")
-            emp_id = st.text_input("Employee ID", st.session_state.get("emp_id_input", ""), key="lb_emp")
-            if st.button("Check Balance"):
+            # form: editing the ID doesn't rerun the script, only the submit does
+            with st.form("leave_balance_form"):
+                emp_id = st.text_input("Employee ID", st.session_state.get("emp_id_input", ""), key="lb_emp")
+                check = st.form_submit_button("Check Balance")
+            if check:
                 if not emp_id.strip():
                     st.error("Please enter an Employee ID.")
                 else:
-                    res = safe_get(f"{API_URL}/leave-balance/{emp_id.strip()}")
-                    if res and res.status_code == 200:
-                        data = res.json()
+                    res = safe_get_cached(f"/leave-balance/{emp_id.strip()}")
+                    if res and res[0] == 200:
+                        data = res[1]
                         lb = data.get("leave_balance", {})
                         c1, c2 = st.columns(2)
                         c1.metric("Casual", lb.get("casual", 0))
                         c2.metric("Sick", lb.get("sick", 0))
                         st.success(data)
                     elif res:
-                        st.error(res.json().get("detail", "Error fetching balance"))
+                        st.error(res[1].get("detail", "Error fetching balance"))
 
         if menu == "Apply Leave":
             st.subheader("📝 Apply Leave")
-            left, right = st.columns(2)
-            with left:
-                emp_id = st.text_input("Employee ID", st.session_state.get("emp_id_input", ""), key="al_emp")
-                leave_type = st.selectbox(
-                    "Leave Type",
-                    ["casual", "sick"],
-                    index=["casual", "sick"].index(st.session_state["leave_type_input"]),
-                    key="al_type",
-                )
-                reason = st.text_area("Reason", value=st.session_state["reason_input"], placeholder="Short reason for leave", key="al_reason")
-            with right:
-                from_date_val = st.date_input("From Date", value=st.session_state["from_date_input"], key="al_from")
-                to_date_val = st.date_input("To Date", value=st.session_state["to_date_input"], key="al_to")
-            submit = st.button("Submit Leave Application", type="primary")
+            # one rerun on submit instead of one per widget edit
+            with st.form("apply_leave_form"):
+                left, right = st.columns(2)
+                with left:
+                    emp_id = st.text_input("Employee ID", st.session_state.get("emp_id_input", ""), key="al_emp")
+                    leave_type = st.selectbox(
+                        "Leave Type",
+                        ["casual", "sick"],
+                        index=["casual", "sick"].index(st.session_state["leave_type_input"]),
+                        key="al_type",
+                    )
+                    reason = st.text_area("Reason", value=st.session_state["reason_input"], placeholder="Short reason for leave", key="al_reason")
+                with right:
+                    from_date_val = st.date_input("From Date", value=st.session_state["from_date_input"], key="al_from")
+                    to_date_val = st.date_input("To Date", value=st.session_state["to_date_input"], key="al_to")
+                submit = st.form_submit_button("Submit Leave Application", type="primary")
             if submit:
                 if not emp_id.strip():
                     st.error("Please enter a valid Employee ID.")
@@ -537,6 +560,8 @@ with left_col:
                     }
                     res = safe_post(f"{API_URL}/apply-leave", json=payload)
                     if res and res.status_code == 200:
+                        # balance and history changed; drop their cached GETs
+                        _get_json_cached.clear()
                         data = res.json()
                         st.success("Leave applied successfully ✅")
                         st.write("### Updated Leave Balance")
@@ -553,17 +578,21 @@ with left_col:
 
         if menu == "Leave History":
             st.subheader("📜 Leave History")
-            emp_id_h = st.text_input("Employee ID for history", st.session_state.get("emp_id_input", ""), key="hist_emp")
-            if st.button("Get Leave History"):
+            with st.form("leave_history_form"):
+                emp_id_h = st.text_input("Employee ID for history", st.session_state.get("emp_id_input", ""), key="hist_emp")
+                get_history = st.form_submit_button("Get Leave History")
+            if get_history:
                 if not emp_id_h.strip():
                     st.error("Please enter an Employee ID.")
                 else:
-                    res = safe_get(f"{API_URL}/leave-history/{emp_id_h.strip()}")
-                    if res and res.status_code == 200:
-                        payload = res.json()
+                    res = safe_get_cached(f"/leave-history/{emp_id_h.strip()}")
+                    if res and res[0] == 200:
+                        payload = res[1]
                         rows = payload.get("history", [])
                         if isinstance(rows, list):
                             if rows:
+                                import pandas as pd  # deferred, see _group_by_month
+
                                 try:
                                     st.dataframe(pd.DataFrame(rows), use_container_width=True)
                                 except Exception:
@@ -574,7 +603,7 @@ with left_col:
                             st.warning("Unexpected response format from backend:")
                             st.json(payload)
                     elif res:
-                        st.error(res.json().get("detail", "No history or error"))
+                        st.error(res[1].get("detail", "No history or error"))
 
         if menu == "Policies":
             st.subheader("📘 Company Policies")
@@ -607,12 +636,10 @@ with left_col:
                 tried.append(p)
                 try:
                     if os.path.exists(p):
-                        with open(p, "r", encoding="utf-8") as fh:
-                            raw_loaded = json.load(fh)
-                            holidays = _normalize_holidays_input(raw_loaded)
-                            hol_error = None
-                            st.info(f"Loaded holidays from: {p}")
-                            break
+                        holidays = _load_holidays(p, os.path.getmtime(p))
+                        hol_error = None
+                        st.info(f"Loaded holidays from: {p}")
+                        break
                 except Exception as e:
                     hol_error = (hol_error + " | " if hol_error else "") + f"{p} read error: {e}"
 
@@ -631,6 +658,8 @@ with left_col:
             else:
                 st.info("No holidays available for display. Add a file at the path above or add entries to HARDCODED_HOLIDAYS.")
                 example = [{"date": f"{selected_year}-01-01", "name": "New Year's Day"}, {"date": f"{selected_year}-01-26", "name": "Republic Day"}]
+                import pandas as pd  # deferred, see _group_by_month
+
                 st.dataframe(pd.DataFrame(example))
 
 
@@ -643,150 +672,28 @@ with right_col:
             "• *I want to take 1 PL from 2025-09-10 to 2025-09-10*\n"
             "• *Show my leave history for 10001*\n"
         )
-        st.session_state["chat_history"].append(("assistant", greet))
+        _append_chat("assistant", greet)
         st.session_state["pixie_greeted"] = True
 
-    for role, content in st.session_state["chat_history"]:
+    # Streamlit repaints every element on each rerun, so only the recent tail
+    # is drawn by default; older turns are painted only when asked for
+    history = st.session_state["chat_history"]
+    shown = history
+    # constant label: the widget id includes it, so a label carrying the
+    # count would reset the toggle on every new message
+    if len(history) > CHAT_RENDER_TAIL and not st.toggle(
+        "Show earlier messages",
+        key="chat_show_all",
+        help=f"{len(history) - CHAT_RENDER_TAIL} older messages are hidden",
+    ):
+        shown = history[-CHAT_RENDER_TAIL:]
+    for role, content in shown:
         with st.chat_message(role):
             st.markdown(content)
 
-    prompt = st.chat_input("Ask Pixie about leaves...")
-    if prompt:
-        st.session_state["chat_history"].append(("user", prompt))
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
-        # preprocess common typo
-        prompt_clean = re.sub(r"\btale\b", "take", prompt, flags=re.IGNORECASE)
-
-        intent = classify_intent(prompt_clean)
-        maybe_emp = extract_emp_id(prompt_clean)
-        if maybe_emp:
-            st.session_state["emp_id_input"] = maybe_emp
-            emp = lookup_employee(maybe_emp)
-            st.session_state["emp_name"] = emp.get("name") if emp else None
-            st.session_state["emp_project"] = emp.get("project") if emp else None
-
-        # intent: check balance -> navigate
-        if intent == "check_balance":
-            emp_id_for_balance = maybe_emp or st.session_state.get("emp_id_input", "").strip()
-
-            if not emp_id_for_balance:
-                need_id_msg = "Please share your **Employee ID** (e.g., `10001`) so I can fetch your leave balance."
-                st.session_state["chat_history"].append(("assistant", need_id_msg))
-                with st.chat_message("assistant"):
-                    st.markdown(need_id_msg)
-            else:
-                st.session_state["emp_id_input"] = emp_id_for_balance
-                nav_msg = f"Opening **Leave Balance** for Employee ID **{emp_id_for_balance}** — navigating to the Leave Balance tab."
-                st.session_state["chat_history"].append(("assistant", nav_msg))
-                with st.chat_message("assistant"):
-                    st.markdown(nav_msg)
-                request_nav("Leave Balance")
-
-        # intent: apply leave -> prefill and navigate
-        elif intent == "apply_leave":
-            lt = normalize_leave_type(prompt_clean) or st.session_state.get("leave_type_input", "casual")
-            d1, d2 = extract_dates(prompt_clean)
-
-            if (re.search(r"\b(1|one)\b\s*(day|days)?\b", prompt_clean.lower()) and d1 and not d2):
-                d2 = d1
-
-            if not d1 and not d2:
-                d1 = d2 = date.today()
-
-            reason_guess = re.search(r"(?:because|as|for|due to|reason)\s+(.+)", prompt_clean, re.IGNORECASE)
-            if reason_guess:
-                reason_text = reason_guess.group(1).strip()[:200]
-                reason_text = _strip_date_phrases(reason_text)
-            else:
-                date_tokens = re.findall(r"\d{4}[/-]\d{2}[/-]\d{2}", prompt_clean)
-                if date_tokens and re.sub(r"[\d\-/\s]", "", prompt_clean).strip() == "":
-                    reason_text = ""
-                else:
-                    reason_text = st.session_state.get("reason_input", "")
-
-            st.session_state["leave_type_input"] = lt
-            st.session_state["from_date_input"] = d1
-            st.session_state["to_date_input"] = d2
-            st.session_state["reason_input"] = reason_text or ""
-
-            emp_display = st.session_state.get("emp_id_input", "") or "—"
-            pref_msg = (
-                "Opening **Apply Leave** with these details prefilled:\n\n"
-                f"• Employee ID: **{emp_display}**\n"
-                f"• Leave type: **{lt}**\n"
-                f"• From: **{d1}**\n"
-                f"• To: **{d2}**\n"
-            )
-            if reason_text:
-                pref_msg += f"• Reason: *{reason_text}*\n\n"
-            pref_msg += "Review and click **Submit Leave Application** to apply."
-
-            if not st.session_state.get("emp_id_input"):
-                ask_msg = (
-                    "I can prefill the leave form for you, but I don't know your Employee ID yet. "
-                    "Please enter your Employee ID in the 'Who are you?' box so I can fetch your profile — "
-                    "I'll keep the date and reason ready for you."
-                )
-                st.session_state["chat_history"].append(("assistant", ask_msg))
-                with st.chat_message("assistant"):
-                    st.markdown(ask_msg)
-                st.session_state["prefill_from_chat"] = {
-                    "leave_type": lt,
-                    "from_date": d1.isoformat() if d1 else None,
-                    "to_date": d2.isoformat() if d2 else None,
-                    "reason": reason_text or "",
-                }
-            else:
-                st.session_state["chat_history"].append(("assistant", pref_msg))
-                with st.chat_message("assistant"):
-                    st.markdown(pref_msg)
-                request_nav("Apply Leave")
-
-        # intent: policies -> show inline and open tab
-        elif intent == "policies":
-            inline = (
-                "Here are key policies:\n"
-                "- **Annual Leave:** 12 days/year\n"
-                "- **Sick Leave:** 8 days/year\n"
-                "- **Carry Forward:** up to 5 days/year\n"
-                "- **Maternity:** typically 26 weeks (see company handbook)\n\n"
-                "Opening **Policies** tab for details."
-            )
-            st.session_state["chat_history"].append(("assistant", inline))
-            with st.chat_message("assistant"):
-                st.markdown(inline)
-            request_nav("Policies")
-
-        else:
-            msg = (
-                "I can help with:\n"
-                "• **Leave Balance** — *'I want to know my leave balance 10001'*.\n"
-                "• **Apply Leave** — *'I want to take 1 PL tomorrow'*.\n"
-                "• **Leave History** — *'Show my leave history for 10001'*.\n"
-                "• **Policies** — *'maternity policy please'*.\n"
-                "Tip: include your **Employee ID**."
-            )
-            st.session_state["chat_history"].append(("assistant", msg))
-            with st.chat_message("assistant"):
-                st.markdown(msg)
+    st.chat_input("Ask Pixie about leaves...", key="chat_prompt", on_submit=_on_chat_submit)
 
 
-# If a prefill exists and user later provided emp id, open Apply Leave
-if st.session_state.get("prefill_from_chat") and st.session_state.get("emp_id_input"):
-    pre = st.session_state.pop("prefill_from_chat")
-    try:
-        st.session_state["leave_type_input"] = pre.get("leave_type", st.session_state.get("leave_type_input"))
-        if pre.get("from_date"):
-            st.session_state["from_date_input"] = date.fromisoformat(pre.get("from_date"))
-        if pre.get("to_date"):
-            st.session_state["to_date_input"] = date.fromisoformat(pre.get("to_date"))
-        st.session_state["reason_input"] = pre.get("reason", st.session_state.get("reason_input"))
-        request_nav("Apply Leave")
-    except Exception:
-        pass
-
 # small CSS tweak
 st.markdown(
     """<style>.stMetric { border-radius: 12px; padding: 8px; }.block-container { padding-top: 3rem; }</style>""",
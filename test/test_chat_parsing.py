@@ -0,0 +1,39 @@
+# test/test_chat_parsing.py
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "UI"))
+
+from chat_parsing import classify_intent, extract_dates, extract_emp_id  # noqa: E402
+
+
+def test_extract_dates_single_iso():
+    d = date(2025, 9, 10)
+    assert extract_dates("take leave on 2025-09-10") == (d, d)
+
+
+def test_extract_dates_iso_range_is_ordered():
+    assert extract_dates("leave 2025/09/12 and 2025-09-10") == (date(2025, 9, 10), date(2025, 9, 12))
+
+
+def test_extract_dates_empty():
+    assert extract_dates("") == (None, None)
+
+
+def test_classify_intent():
+    assert classify_intent("what is my leave balance") == "check_balance"
+    assert classify_intent("show leave history") == "leave_history"
+    assert classify_intent("I want to take leave tomorrow") == "apply_leave"
+    assert classify_intent("tale leave for 2 days") == "apply_leave"
+    assert classify_intent("list the holiday policies") == "policies"
+    assert classify_intent("hello there") == "unknown"
+    assert classify_intent("") == "unknown"
+
+
+def test_extract_emp_id():
+    assert extract_emp_id("balance for 10001") == "10001"
+    assert extract_emp_id("balance for E10002") == "10002"
+    assert extract_emp_id("leave in 2025") is None
+    assert extract_emp_id("no id here") is None
+    assert extract_emp_id("") is None